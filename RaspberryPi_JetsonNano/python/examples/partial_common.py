@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# Shared pieces of the Waveshare 7.5" mono V2 partial-refresh examples:
+# packing helpers, the paragraph writer and the partial display helpers
+
+import sys, time
+from array import array
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lib"))
+
+from PIL import Image, ImageDraw, ImageFont, ImageChops
+from waveshare_epd import epdconfig
+
+FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+SPI_HZ = 20_000_000  # 7.5" V2 is fine well above the 10 MHz default
+
+def load_font(size=28):
+    try:
+        return ImageFont.truetype(FONT_PATH, size)
+    except Exception:
+        return ImageFont.load_default()
+
+def set_spi_speed(hz):
+    """Raise the SPI clock for this and every later module_init()"""
+    try:
+        epdconfig.set_spi_hz(hz)
+    except Exception as e:
+        print(f"Could not set SPI clock to {hz} Hz: {e}")
+
+def align8(x):  # controller packs 8 px per byte
+    return x - (x % 8)
+
+def up8(x):
+    return x if x % 8 == 0 else x + (8 - (x % 8))
+
+def extract_region_bytes(fullbuf, full_width, x0, y0, x1, y1):
+    """
+    Slice a full-frame 1bpp buffer into window-only bytes for [x0:x1) x [y0:y1).
+    x0/x1 must be 8-aligned. Returns a bytearray.
+    """
+    if not isinstance(fullbuf, (bytes, bytearray)):
+        fullbuf = bytes(fullbuf)
+    bytes_per_row = full_width // 8
+    region_bytes_per_row = max((x1 - x0) // 8, 0)
+    xbyte = x0 // 8
+    # Size is known up front: fill a preallocated buffer row by row
+    region = bytearray(max(y1 - y0, 0) * region_bytes_per_row)
+    if not region:
+        return region
+    mv = memoryview(region)
+    fb = memoryview(fullbuf)
+    src = y0 * bytes_per_row + xbyte  # stride through the frame, no per-row multiply
+    for dst in range(0, len(region), region_bytes_per_row):
+        mv[dst : dst + region_bytes_per_row] = fb[src : src + region_bytes_per_row]
+        src += bytes_per_row
+    return region
+
+def pack_region(img, x0, y0, x1, y1):
+    """
+    Pack only the window [x0:x1) x [y0:y1) of a mode "1" image, in the same
+    byte order as epd.getbuffer() (1 = black). x0/x1 must be 8-aligned.
+    """
+    return img.crop((x0, y0, x1, y1)).tobytes("raw", "1;I")
+
+def draw_base(W, H, font, title="", border=False):
+    """Draw the base background with title and grid"""
+    img = Image.new("1", (W, H), 255)
+    d = ImageDraw.Draw(img)
+    
+    if border:
+        d.rectangle((0, 0, W-1, H-1), outline=0, width=2)
+    
+    # Title
+    d.text((20, 16), title, font=font, fill=0)
+    
+    # Light grid to help spot partial vs full updates
+    step = 40
+    for x in range(0, W, step):
+        d.line((x, 0, x, H-1), fill=0)
+    for y in range(0, H, step):
+        d.line((0, y, W-1, y), fill=0)
+    
+    return img
+
+# Where place() put a word, and whether it had to wrap to a new line
+Placement = namedtuple("Placement", "x y width wrapped")
+
+class ParagraphWriter:
+    """Handles paragraph-style word display with wrapping"""
+    
+    def __init__(self, W, H, font, start_x=50, start_y=100, line_height=40, margin=50, base_img=None):
+        self.W = W
+        self.H = H
+        self.font = font
+        self.start_x = start_x
+        self.start_y = start_y
+        self.line_height = line_height
+        self.margin = margin
+        self.max_width = W - 2 * margin
+        self.current_x = start_x
+        self.current_y = start_y
+        # Word layout as parallel arrays: words[i] is drawn at (xs[i], ys[i])
+        self.words = []
+        self.xs = array('i')
+        self.ys = array('i')
+        # Cleared on the first failed partial refresh; later frames skip it
+        self.partial_ok = True
+        # Partial refreshes run on one worker thread while the next frame is built
+        self.pool = ThreadPoolExecutor(max_workers=1)
+        self.pending = None
+        
+        # One measuring surface and a width cache shared by every lookup
+        self._probe = ImageDraw.Draw(Image.new("1", (1, 1)))
+        self._widths = {}
+        self._space_w = self.get_word_width(" ")
+        # Rendered ink mask per word, pasted instead of re-rendering text
+        self._glyph_cache = {}
+        
+        # Static background, rendered and packed once
+        self.base_img = base_img if base_img is not None else draw_base(W, H, font)
+        self.base_packed = self.base_img.tobytes("raw", "1;I")
+        
+        # Persistent frame: new words are drawn onto it instead of re-rendering
+        self.canvas = self.base_img.copy()
+        # Packed 1bpp copy of the canvas in driver byte order (1 = black),
+        # same layout as epd.getbuffer(); repacked only where words land
+        self.packed = bytearray(self.base_packed)
+        # Frame as last sent to the panel, diffed to find what changed
+        self.shown = self.base_img.copy()
+        
+    def sync_packed(self, x0, y0, x1, y1):
+        """Repack the canvas box [x0:x1) x [y0:y1) into the packed buffer"""
+        x0 = max(align8(x0), 0)
+        x1 = min(up8(x1), self.W)
+        y0 = max(y0, 0)
+        y1 = min(y1, self.H)
+        if x1 <= x0 or y1 <= y0:
+            return
+        src = memoryview(self.canvas.crop((x0, y0, x1, y1)).tobytes("raw", "1;I"))
+        bytes_per_row = self.W // 8
+        region_bytes_per_row = (x1 - x0) // 8
+        mv = memoryview(self.packed)
+        dst = y0 * bytes_per_row + x0 // 8
+        for i in range(0, len(src), region_bytes_per_row):
+            mv[dst : dst + region_bytes_per_row] = src[i : i + region_bytes_per_row]
+            dst += bytes_per_row
+        
+    def send_partial(self, epd, region, x0, y0, x1, y1, label):
+        """Queue a partial refresh; the previous one is waited for first"""
+        self.wait_partial()
+        if not self.partial_ok:
+            return
+        future = self.pool.submit(epd.display_Partial, region, x0, y0, x1, y1)
+        self.pending = (future, label)
+        
+    def wait_partial(self):
+        """Wait for the in-flight partial refresh and report how it went"""
+        if self.pending is None:
+            return
+        future, label = self.pending
+        self.pending = None
+        try:
+            future.result()
+            print(f"✓ Partial refresh successful for {label}")
+        except Exception as e:
+            print(f"✗ Partial refresh failed for {label}: {e}")
+            # Don't fall back to a multi-second full refresh per word
+            print("Partial refresh disabled; the full frame is shown on exit")
+            self.partial_ok = False
+
+    def poll_partial(self):
+        """Report the in-flight partial refresh if it has finished, without blocking"""
+        if self.pending is not None and self.pending[0].done():
+            self.wait_partial()
+
+    def take_dirty_box(self):
+        """
+        Return the 8-aligned box where the canvas differs from the frame last
+        sent, and mark it as sent. Returns None when nothing changed.
+        """
+        bbox = ImageChops.logical_xor(self.shown, self.canvas).getbbox()
+        if bbox is None:
+            return None
+        x0, y0, x1, y1 = align8(bbox[0]), bbox[1], up8(bbox[2]), bbox[3]
+        self.shown.paste(self.canvas.crop((x0, y0, x1, y1)), (x0, y0))
+        return x0, y0, x1, y1
+        
+    def get_word_width(self, word):
+        """Get the width of a word in pixels"""
+        w = self._widths.get(word)
+        if w is None:
+            bbox = self._probe.textbbox((0, 0), word, font=self.font)
+            w = bbox[2] - bbox[0]
+            self._widths[word] = w
+        return w
+    
+    def get_glyph(self, word):
+        """Get a word's ink mask and its offset from the text origin"""
+        entry = self._glyph_cache.get(word)
+        if entry is None:
+            left, top, right, bottom = self._probe.textbbox((0, 0), word, font=self.font)
+            glyph = Image.new("1", (right - left, bottom - top), 0)
+            ImageDraw.Draw(glyph).text((-left, -top), word, font=self.font, fill=255)
+            entry = (glyph, left, top)
+            self._glyph_cache[word] = entry
+        return entry
+    
+    def get_space_width(self):
+        """Get the width of a space character"""
+        return self._space_w
+    
+    def place(self, word):
+        """Measure and place a word in one pass, wrapping if necessary"""
+        word_width = self.get_word_width(word)
+        space_width = self._space_w
+        wrapped = False
+        
+        # Calculate where this word would be placed
+        if self.words:
+            # Add space before word
+            word_x = self.current_x + space_width
+            if word_x + space_width + word_width > self.W - self.margin:
+                # Move to next line
+                word_x = self.start_x
+                self.current_y += self.line_height
+                wrapped = True
+        else:
+            # First word, no space needed
+            word_x = self.current_x
+        
+        word_y = self.current_y
+        
+        # Update current position for next word
+        self.current_x = word_x + word_width
+        
+        self.words.append(word)
+        self.xs.append(word_x)
+        self.ys.append(word_y)
+        return Placement(word_x, word_y, word_width, wrapped)
+
+def draw_paragraph_frame(writer, start):
+    """Draw the words placed from index start onward and return the packed frame"""
+    for word, x, y in zip(writer.words[start:], writer.xs[start:], writer.ys[start:]):
+        glyph, dx, dy = writer.get_glyph(word)
+        if glyph.width == 0 or glyph.height == 0:
+            continue
+        # Black through the word's ink mask; the grid underneath is kept
+        writer.canvas.paste(0, (x + dx, y + dy), glyph)
+        writer.sync_packed(x + dx, y + dy, x + dx + glyph.width, y + dy + glyph.height)
+    return writer.packed
+
+def display_word_with_partial(epd, word, writer, delay=1.5):
+    """Display a word in paragraph style using partial refresh"""
+    W, H = epd.width, epd.height
+    
+    # Add word to paragraph and get position
+    start = len(writer.words)
+    placed = writer.place(word)
+    
+    # Draw the new word; the packed frame is updated in place, no getbuffer
+    fullbuf = draw_paragraph_frame(writer, start)
+    
+    # Only the word's ink differs from the panel, so size the window to it;
+    # the static grid rows above and below the glyphs are not resent
+    box = writer.take_dirty_box()
+    if box is None:
+        return
+    x0, y0, x1, y1 = box
+    
+    print(f"Displaying: '{word}' at position ({placed.x}, {placed.y}) in region ({x0}, {y0}, {x1}, {y1})")
+    
+    if not writer.partial_ok:
+        return
+    
+    # Extract region bytes for partial update
+    region_bytes = extract_region_bytes(fullbuf, W, x0, y0, x1, y1)
+    
+    # Use partial refresh (sent in the background)
+    writer.send_partial(epd, bytes(region_bytes), x0, y0, x1, y1, f"'{word}'")
+    
+    # Wait before next word
+    time.sleep(delay)
+
+def display_line_with_partial(epd, line, writer, delay=0.1):
+    """Display an entire line of text using partial refresh"""
+    W, H = epd.width, epd.height
+    
+    # Clean the line - remove special characters that might cause issues
+    clean_line = ''.join(c for c in line if c.isalnum() or c in ' -.')
+    
+    if not clean_line:
+        return
+    
+    # Split into words
+    words = clean_line.split()
+    
+    if not words:
+        return
+    
+    # Add all words to the paragraph
+    start = len(writer.words)
+    for word in words:
+        writer.place(word)
+    
+    # Draw the new words; the packed frame is updated in place, no getbuffer
+    fullbuf = draw_paragraph_frame(writer, start)
+    
+    # Diff against the last frame sent for the region that actually changed;
+    # unlike first-word-to-last-word it stays correct when the line wraps
+    box = writer.take_dirty_box()
+    if box is None:
+        return
+    x0, y0, x1, y1 = box
+    
+    print(f"Displaying line: '{clean_line}' in region ({x0}, {y0}, {x1}, {y1})")
+    
+    if not writer.partial_ok:
+        return
+    
+    # Extract region bytes for partial update
+    region_bytes = extract_region_bytes(fullbuf, W, x0, y0, x1, y1)
+    
+    # Use partial refresh (sent in the background)
+    writer.send_partial(epd, bytes(region_bytes), x0, y0, x1, y1, f"line: '{clean_line}'")
+    
+    # Wait before next line
+    time.sleep(delay)
@@ -2,45 +2,15 @@
 # Minimal partial-refresh probe for Waveshare 7.5" mono V2
 # Focus: verify *true* partial updates in the simplest possible way.
 
-import sys, time
+import argparse, sys, time
 from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parents[1] / "lib"))
 
-from PIL import Image, ImageDraw, ImageFont, ImageChops
+from PIL import ImageDraw
 from waveshare_epd import epd7in5_V2 as driver
+from partial_common import SPI_HZ, load_font, set_spi_speed, align8, up8, pack_region, draw_base
 
-FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
-
-def load_font(size=28):
-    try:
-        return ImageFont.truetype(FONT_PATH, size)
-    except Exception:
-        return ImageFont.load_default()
-
-def align8(x):  # controller packs 8 px per byte
-    return x - (x % 8)
-
-def up8(x):
-    return x if x % 8 == 0 else x + (8 - (x % 8))
-
-def extract_region_bytes(fullbuf, full_width, x0, y0, x1, y1):
-    """
-    Slice a full-frame 1bpp buffer into window-only bytes for [x0:x1) x [y0:y1).
-    x0/x1 must be 8-aligned. Returns a list of bytes.
-    """
-    if not isinstance(fullbuf, (bytes, bytearray, list)):
-        fullbuf = bytes(fullbuf)
-    bytes_per_row = full_width // 8
-    region_bytes_per_row = (x1 - x0) // 8
-    xbyte = x0 // 8
-    out = []
-    idx = 0
-    for y in range(y0, y1):
-        row_start = y * bytes_per_row
-        seg = fullbuf[row_start + xbyte : row_start + xbyte + region_bytes_per_row]
-        out.extend(seg)
-        idx += 1
-    return out
+TITLE = "Partial Probe — 7.5\" V2"
 
 def find_partial(epd):
     base = None
@@ -53,55 +23,58 @@ def find_partial(epd):
             part = name; break
     return base, part
 
+# Index of the argument layout that worked, so later frames skip the probing
+_PARTIAL_SIG = None
+_FULLFRAME_SIG = None
+
 def call_partial_window(epd, method_name, region_bytes, x0, y0, x1, y1):
     """
-    Try common partial signatures in priority order.
+    Try common partial signatures in priority order; the first one that
+    works is remembered and used directly on later calls.
     Returns True on success.
     """
+    global _PARTIAL_SIG
     fn = getattr(epd, method_name)
+    # One contiguous buffer so the driver can hand it to SPI as a single block
+    region_bytes = bytes(region_bytes)
     # Most 7.5 V2 drivers use Xstart,Ystart,Xend,Yend (end exclusive or driver -1 internally)
     tries = [
         (region_bytes, x0, y0, x1, y1),
         (region_bytes, x0, y0, (x1 - x0), (y1 - y0)),  # some use width,height
-        ([*region_bytes], x0, y0, x1, y1),             # list vs bytes
     ]
-    for args in tries:
+    if _PARTIAL_SIG is not None:
+        fn(*tries[_PARTIAL_SIG])
+        return True
+    for i, args in enumerate(tries):
         try:
             fn(*args)
+            _PARTIAL_SIG = i
             return True
         except TypeError:
             continue
     return False
 
 def call_partial_fullframe(epd, method_name, fullbuf, W, H):
+    global _FULLFRAME_SIG
     fn = getattr(epd, method_name)
     tries = [
         (fullbuf, 0, 0, W, H),
         (fullbuf,),  # some variants take just a full buffer
     ]
-    for args in tries:
+    if _FULLFRAME_SIG is not None:
+        fn(*tries[_FULLFRAME_SIG])
+        return True
+    for i, args in enumerate(tries):
         try:
             fn(*args)
+            _FULLFRAME_SIG = i
             return True
         except TypeError:
             continue
     return False
 
-def draw_base(W, H, font):
-    img = Image.new("1", (W, H), 255)
-    d = ImageDraw.Draw(img)
-    d.rectangle((0, 0, W-1, H-1), outline=0, width=2)
-    d.text((20, 16), "Partial Probe — 7.5\" V2", font=font, fill=0)
-    # light grid helps spot real partial vs full
-    step = 40
-    for x in range(0, W, step):
-        d.line((x, 0, x, H-1), fill=0)
-    for y in range(0, H, step):
-        d.line((0, y, W-1, y), fill=0)
-    return img
-
-def draw_ticker_frame(W, H, font, flip=False, box=(200, 120, 440, 200)):
-    img = draw_base(W, H, font)
+def draw_ticker_frame(base_img, font, flip=False, box=(200, 120, 440, 200)):
+    img = base_img.copy()  # background is rendered once by the caller
     d = ImageDraw.Draw(img)
     x0, y0, x1, y1 = box
     msg = "TICK" if not flip else "TOCK"
@@ -114,6 +87,11 @@ def draw_ticker_frame(W, H, font, flip=False, box=(200, 120, 440, 200)):
     return img
 
 def main():
+    parser = argparse.ArgumentParser(description="Partial-refresh probe for Waveshare 7.5\" V2")
+    parser.add_argument("--spi-hz", type=int, default=SPI_HZ,
+                        help="SPI clock to use after init (default: %(default)d)")
+    args = parser.parse_args()
+
     epd = driver.EPD()
 
     # Init (prefer fast if present)
@@ -121,6 +99,7 @@ def main():
         epd.init_fast()
     else:
         epd.init()
+    set_spi_speed(args.spi_hz)
 
     # Clean start
     if hasattr(epd, "Clear"):
@@ -130,7 +109,7 @@ def main():
     font = load_font(24)
 
     # --- 1) Full base push ---
-    base_img = draw_base(W, H, font)
+    base_img = draw_base(W, H, font, TITLE, border=True)
     base_buf = epd.getbuffer(base_img)
     epd.display(base_buf)
 
@@ -148,7 +127,7 @@ def main():
     if not part_name:
         print("[probe] No partial method found; doing two normal full updates as a sanity check.")
         for flip in (False, True):
-            img = draw_ticker_frame(W, H, font, flip=flip)
+            img = draw_ticker_frame(base_img, font, flip=flip)
             epd.display(epd.getbuffer(img))
             time.sleep(1.0)
         epd.sleep()
@@ -165,9 +144,9 @@ def main():
     success_region = False
     try:
         for i in range(4):
-            img = draw_ticker_frame(W, H, font, flip=(i % 2 == 1), box=raw_box)
-            fullbuf = epd.getbuffer(img)
-            region = extract_region_bytes(fullbuf, W, x0, y0, x1, y1)
+            img = draw_ticker_frame(base_img, font, flip=(i % 2 == 1), box=raw_box)
+            # Pack just the window; no full-frame getbuffer per flip
+            region = pack_region(img, x0, y0, x1, y1)
             ok = call_partial_window(epd, part_name, region, x0, y0, x1, y1)
             if not ok:
                 print("[probe] region-partial call signature mismatch; aborting region test.")
@@ -183,7 +162,7 @@ def main():
     success_fullwin = False
     try:
         for i in range(4):
-            img = draw_ticker_frame(W, H, font, flip=(i % 2 == 1), box=raw_box)
+            img = draw_ticker_frame(base_img, font, flip=(i % 2 == 1), box=raw_box)
             fullbuf = epd.getbuffer(img)
             ok = call_partial_fullframe(epd, part_name, fullbuf, W, H)
             if not ok:
@@ -40,6 +40,12 @@ GRAY2  = 0xC0
 GRAY3  = 0x80 #gray
 GRAY4  = 0x00 #Blackest
 
+# bytes.translate() table that inverts every pixel of a packed byte
+INVERT_TABLE = bytes(0xFF - i for i in range(256))
+# constant frames to pad partial windows from / clear with, without copying
+WHITE_FRAME = memoryview(b'\xff' * (EPD_WIDTH * EPD_HEIGHT // 8))
+BLACK_FRAME = memoryview(bytes(EPD_WIDTH * EPD_HEIGHT // 8))
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -91,9 +97,10 @@ class EPD:
         t0 = time.monotonic()
 
         self.send_command(0x71)
-        while epdconfig.digital_read(self.busy_pin) != READY_LEVEL:
+        # wait_busy() returns as soon as BUSY changes; the 0x71 status
+        # read is still repeated every 10 ms as in the reference code
+        while not epdconfig.wait_busy(10, READY_LEVEL):
             self.send_command(0x71)
-            epdconfig.delay_ms(10)
             if (time.monotonic() - t0) * 1000 > TIMEOUT_MS:
                 logger.error("e-Paper busy timeout after %d ms", TIMEOUT_MS)
                 raise TimeoutError("EPD busy wait timed out")
@@ -258,11 +265,9 @@ class EPD:
             # return a blank buffer
             return [0x00] * (int(self.width/8) * self.height)
 
-        buf = bytearray(img.tobytes('raw'))
         # The bytes need to be inverted, because in the PIL world 0=black and 1=white, but
-        # in the e-paper world 0=white and 1=black.
-        for i in range(len(buf)):
-            buf[i] ^= 0xFF
+        # in the e-paper world 0=white and 1=black. PIL's '1;I' packer does both in one pass.
+        buf = bytearray(img.tobytes('raw', '1;I'))
         return buf
     
     def getbuffer_4Gray(self, image):
@@ -307,10 +312,7 @@ class EPD:
         else:
             Width = self.width // 8 +1
         Height = self.height
-        image1 = [0xFF] * int(self.width * self.height / 8)
-        for j in range(Height):
-                for i in range(Width):
-                    image1[i + j * Width] = ~image[i + j * Width]
+        image1 = bytes(image[:Width * Height]).translate(INVERT_TABLE)
         self.send_command(0x10)
         self.send_data2(image1)
 
@@ -322,10 +324,11 @@ class EPD:
         self.ReadBusy()
 
     def Clear(self):
+        # buffers, not 48000-int lists: spidev takes them as-is
         self.send_command(0x10)
-        self.send_data2([0xFF] * int(self.width * self.height / 8))
+        self.send_data2(WHITE_FRAME)
         self.send_command(0x13)
-        self.send_data2([0x00] * int(self.width * self.height / 8))
+        self.send_data2(BLACK_FRAME)
 
         self.send_command(0x12)
         epdconfig.delay_ms(100)
@@ -345,29 +348,34 @@ class EPD:
         Width = (Xend - Xstart) // 8
         Height = Yend - Ystart
 	
-        self.send_command(0x50)
-        self.send_data(0xA9)
-        self.send_data(0x07)
-
-        self.send_command(0x91)		#This command makes the display enter partial mode
-        self.send_command(0x90)		#resolution setting
-        self.send_data (Xstart//256)
-        self.send_data (Xstart%256)   #x-start    
-
-        self.send_data ((Xend-1)//256)		
-        self.send_data ((Xend-1)%256)  #x-end	
-
-        self.send_data (Ystart//256)  #
-        self.send_data (Ystart%256)   #y-start    
-
-        self.send_data ((Yend-1)//256)		
-        self.send_data ((Yend-1)%256)  #y-end
-        self.send_data (0x01)
-
-        image1 = [0xFF] * int(self.width * self.height / 8)
-        for j in range(Height):
-                for i in range(Width):
-                    image1[i + j * Width] = ~Image[i + j * Width]
+        epdconfig.spi_begin_batch()  # register setup goes out in a few transfers
+        try:
+            self.send_command(0x50)
+            self.send_data(0xA9)
+            self.send_data(0x07)
+
+            self.send_command(0x91)		#This command makes the display enter partial mode
+            self.send_command(0x90)		#resolution setting
+            self.send_data (Xstart//256)
+            self.send_data (Xstart%256)   #x-start    
+
+            self.send_data ((Xend-1)//256)		
+            self.send_data ((Xend-1)%256)  #x-end	
+
+            self.send_data (Ystart//256)  #
+            self.send_data (Ystart%256)   #y-start    
+
+            self.send_data ((Yend-1)//256)		
+            self.send_data ((Yend-1)%256)  #y-end
+            self.send_data (0x01)
+        finally:
+            epdconfig.spi_end_batch()
+
+        size = int(self.width * self.height / 8)
+        region = bytes(Image[:min(max(Width * Height, 0), size)]).translate(INVERT_TABLE)
+        image1 = epdconfig.spi_scratch(size)  # reused between calls
+        image1[:len(region)] = region
+        image1[len(region):] = WHITE_FRAME[len(region):size]
 
         self.send_command(0x13)   #Write Black and White image to RAM
         self.send_data2(image1)
@@ -456,5 +464,5 @@ class EPD:
         self.send_data(0XA5)
         
         epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        epdconfig.module_sleep()  # SPI stays open for the next init()
 ### END OF FILE ###
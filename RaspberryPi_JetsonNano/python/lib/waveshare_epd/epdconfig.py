@@ -1,8 +1,8 @@
 # /*****************************************************************************
 # * | File        :   epdconfig.py
-# * | Author      :   Waveshare team (edited for RPi.GPIO + spidev)
+# * | Author      :   Waveshare team (edited for libgpiod + spidev)
 # * | Function    :   Hardware underlying interface
-# * | Version     :   V1.2 (RPi.GPIO rewrite)
+# * | Version     :   V1.3 (libgpiod v2 + hardware CS, Python 3 only)
 # * | Date        :   2022-10-29 (edited 2025-09-15)
 # ******************************************************************************
 # Permission is hereby granted, free of charge, to any person obtaining a copy
@@ -25,99 +25,402 @@
 #
 
 import os
+import functools
 import logging
-import sys
+import struct
 import time
-import subprocess
 from ctypes import *
 
 logger = logging.getLogger(__name__)
 
 # ----------------------------------------------------------------------
-# Raspberry Pi implementation (RPi.GPIO + spidev, BUSY active-low)
+# Raspberry Pi GPIO backends, tried in order by _gpio_backend(). Each one
+# claims pins from a {pin: level} map (level None = BUSY-style pulled-up
+# input), then drives/reads them, and drain()/wait_edge() serve wait_busy.
+# ----------------------------------------------------------------------
+class _GpiodGPIO:
+    # libgpiod v2 bindings (pip "gpiod>=2"): held line requests, edge fd
+    def __init__(self, chip):
+        import gpiod
+        import gpiod.line
+        self.gpiod = gpiod
+        self.chip = chip
+        self._LEVEL = (gpiod.line.Value.INACTIVE, gpiod.line.Value.ACTIVE)
+        self._lines = {}     # pin -> LineRequest, held open until release()
+
+    def claim(self, levels):
+        """
+        Request every pin not held yet in one request_lines() call; inputs
+        report edge events (for wait_busy). Requests (open chardev fds) are
+        kept, so reads and writes are a single ioctl; held outputs are just
+        re-driven.
+        """
+        line = self.gpiod.line
+        config = {}
+        for pin, value in levels.items():
+            if pin in self._lines:
+                if value is not None:
+                    self.out(pin, value)
+            elif value is None:
+                config[pin] = self.gpiod.LineSettings(direction=line.Direction.INPUT,
+                                                      bias=line.Bias.PULL_UP,
+                                                      edge_detection=line.Edge.BOTH)
+            else:
+                config[pin] = self.gpiod.LineSettings(direction=line.Direction.OUTPUT,
+                                                      output_value=self._LEVEL[value])
+        if config:
+            req = self.gpiod.request_lines(self.chip, consumer="epdconfig", config=config)
+            for pin in config:
+                self._lines[pin] = req
+
+    def out(self, pin, value):
+        self._lines[pin].set_value(pin, self._LEVEL[1 if value else 0])
+
+    def read(self, pin):
+        return self._lines[pin].get_value(pin).value
+
+    def out_many(self, pin_values):
+        # one set_values() ioctl per line request (normally just one)
+        by_req = {}
+        for pin, value in pin_values.items():
+            req = self._lines[pin]
+            by_req.setdefault(id(req), (req, {}))[1][pin] = self._LEVEL[1 if value else 0]
+        for req, values in by_req.values():
+            req.set_values(values)
+
+    def drain(self, pin):
+        req = self._lines[pin]
+        while req.wait_edge_events(0):
+            req.read_edge_events()
+
+    def wait_edge(self, pin, timeout):
+        self._lines[pin].wait_edge_events(timeout)  # poll() on the request fd
+
+    def release(self):
+        for req in {id(r): r for r in self._lines.values()}.values():  # pins share requests
+            try:
+                req.release()
+            except Exception:
+                pass
+        self._lines.clear()
+
+
+class _LgpioGPIO:
+    # lgpio (python3-lgpio, shipped with Raspberry Pi OS): chardev, one handle
+    POLL_S = 0.005           # no blocking edge wait without a callback thread
+
+    def __init__(self, chip):
+        import lgpio
+        self.lgpio = lgpio
+        self.chip = int(chip.rsplit('gpiochip', 1)[-1])
+        self._h = None
+        self._pins = set()
+
+    def claim(self, levels):
+        if self._h is None:
+            self._h = self.lgpio.gpiochip_open(self.chip)
+        for pin, value in levels.items():
+            if pin in self._pins:
+                if value is not None:
+                    self.out(pin, value)
+            elif value is None:
+                self.lgpio.gpio_claim_input(self._h, pin, self.lgpio.SET_PULL_UP)
+            else:
+                self.lgpio.gpio_claim_output(self._h, pin, value)
+            self._pins.add(pin)
+
+    def out(self, pin, value):
+        self.lgpio.gpio_write(self._h, pin, 1 if value else 0)
+
+    def read(self, pin):
+        return self.lgpio.gpio_read(self._h, pin)
+
+    def out_many(self, pin_values):
+        for pin, value in pin_values.items():
+            self.out(pin, value)
+
+    def drain(self, pin):
+        pass
+
+    def wait_edge(self, pin, timeout):
+        time.sleep(min(timeout, self.POLL_S))
+
+    def release(self):
+        if self._h is not None:
+            for pin in self._pins:
+                try:
+                    self.lgpio.gpio_free(self._h, pin)
+                except Exception:
+                    pass
+            self.lgpio.gpiochip_close(self._h)
+            self._h = None
+            self._pins.clear()
+
+
+class _RPiGPIO:
+    # RPi.GPIO: last resort (does not work on the Pi 5)
+    POLL_S = 0.005           # wait_for_edge() uses sysfs, broken on kernels >= 6.6
+
+    def __init__(self, chip):
+        import RPi.GPIO as GPIO
+        self.GPIO = GPIO
+        self._pins = set()
+
+    def claim(self, levels):
+        GPIO = self.GPIO
+        GPIO.setwarnings(False)
+        GPIO.setmode(GPIO.BCM)
+        for pin, value in levels.items():
+            if pin in self._pins:
+                if value is not None:
+                    GPIO.output(pin, value)
+            elif value is None:
+                GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            else:
+                GPIO.setup(pin, GPIO.OUT, initial=GPIO.HIGH if value else GPIO.LOW)
+            self._pins.add(pin)
+
+    def out(self, pin, value):
+        self.GPIO.output(pin, value)
+
+    def read(self, pin):
+        return self.GPIO.input(pin)
+
+    def out_many(self, pin_values):
+        self.GPIO.output(list(pin_values), list(pin_values.values()))
+
+    def drain(self, pin):
+        pass
+
+    def wait_edge(self, pin, timeout):
+        time.sleep(min(timeout, self.POLL_S))
+
+    def free(self, pin):
+        # hand one pin back (as an input); only the .so path's CS needs this
+        if pin in self._pins:
+            self.GPIO.cleanup(pin)
+            self._pins.discard(pin)
+
+    def release(self):
+        if self._pins:
+            try:
+                self.GPIO.cleanup(list(self._pins))
+            except Exception:
+                self.GPIO.cleanup()
+            self._pins.clear()
+
+
+def _gpio_backend(chip):
+    for backend in (_GpiodGPIO, _LgpioGPIO, _RPiGPIO):
+        try:
+            return backend(chip)
+        except ImportError:  # also covers the gpiod v1 bindings (no gpiod.line)
+            continue
+    raise ImportError("No GPIO library found: install gpiod>=2, lgpio or RPi.GPIO")
+
+
+# ----------------------------------------------------------------------
+# Raspberry Pi implementation (libgpiod v2 + spidev, BUSY active-low)
 # ----------------------------------------------------------------------
 class RaspberryPi:
     # Pin definition (BCM numbering) — mirror your working C++ pins
     RST_PIN   = 17
     DC_PIN    = 25
-    CS_PIN    = 8            # not used directly when spidev controls CS
+    CS_PIN    = 8            # CE0; drivers still read it, but spidev drives it
+                             # and digital_write() ignores it (except .so path)
     BUSY_PIN  = 24
     PWR_PIN   = 18
 
     # SPI selection: CE0 -> (bus=0, device=0), CE1 -> (bus=0, device=1)
     SPI_BUS     = 0
     SPI_DEVICE  = 0          # change to 1 if you wired CE1
-    SPI_CLOCK_HZ = 4000000   # try 2_000_000 if you see signal issues
+    # UC8179 is rated for 10 MHz; override with EPD_SPI_HZ (e.g. 4000000
+    # or 2000000 if you see signal issues on long wires), read in __init__
+    SPI_CLOCK_HZ = 10000000
+
+    # GPIO character device (/dev/gpiochip4 on a Pi 5 with kernels before 6.6.45);
+    # the library is the first of gpiod v2, lgpio, RPi.GPIO that imports
+    GPIO_CHIP   = '/dev/gpiochip0'
+
+    # delay_ms() below this spins on perf_counter_ns instead of sleeping:
+    # time.sleep() overshoots sub-millisecond requests by scheduler latency
+    DELAY_SPIN_MS = 2.0
+
+    _DEV_SPI_cache = {}      # so name -> CDLL, loaded once per process
 
     def __init__(self):
-        import RPi.GPIO as GPIO
         import spidev
-        self.GPIO = GPIO
+        self._gpio = _gpio_backend(self.GPIO_CHIP)
+        self._gpio_out = self._gpio.out   # bound once: these are the hot path
+        self._gpio_in = self._gpio.read
         self.SPI  = spidev.SpiDev()
+        self.SPI_CLOCK_HZ = self._env_spi_hz()
         self._gpio_inited = False
         self._spi_inited  = False
         self.DEV_SPI = None  # used only when cleanup=True path is selected
+        # DEV_SPI_* targets: no-ops until module_init(cleanup=True) binds
+        # the .so functions, so the calls need no "is it loaded" check
+        self._dev_send = self._dev_sendn = lambda data: None
+        self._dev_recv = lambda: 0
+        self._cs_gpio = False  # True on the legacy .so path, where Python drives CS
+        self._spi_no_cs = False  # the CS mode the open SPI fd was configured for
+        self._dc = 0         # last DC level the driver asked for
+        self._batch = None   # [[dc, bytearray], ...] while a batch is open
+        self._spi_scratch = bytearray(self._spi_bufsiz())
 
     # --- GPIO helpers expected by drivers ---
     def digital_write(self, pin, value):
-        self.GPIO.output(pin, value)
+        if pin == self.DC_PIN:
+            self._dc = value
+        elif pin == self.CS_PIN and not self._cs_gpio:
+            return  # spidev asserts CE0/CE1 around every transfer itself
+        if self._batch is not None:
+            if pin == self.DC_PIN or pin == self.CS_PIN:
+                return  # applied per chunk when the batch is flushed
+            self._spi_flush_batch()
+        self._gpio_out(pin, value)
+
+    def digital_write_many(self, pin_values):
+        """
+        Drive several pins together, e.g. {RST_PIN: 0, DC_PIN: 0}: with
+        gpiod that is one set_values() ioctl instead of one per pin.
+        Takes a dict or (pin, value) pairs.
+        """
+        pin_values = dict(pin_values)
+        if self._batch is not None:
+            for pin, value in pin_values.items():
+                self.digital_write(pin, value)
+            return
+        if self.DC_PIN in pin_values:
+            self._dc = pin_values[self.DC_PIN]
+        if not self._cs_gpio:
+            pin_values.pop(self.CS_PIN, None)
+        self._gpio.out_many(pin_values)
 
     def digital_read(self, pin):
+        if self._batch:
+            self._spi_flush_batch()
         # BUSY is wired active-low on most UC8179 7.5" V2 boards
         # We return the raw GPIO level (0=LOW, 1=HIGH).
-        return self.GPIO.input(pin)
+        return self._gpio_in(pin)
 
     def delay_ms(self, delaytime):
-        time.sleep(delaytime / 1000.0)
+        if self._batch:
+            self._spi_flush_batch()
+        if delaytime >= self.DELAY_SPIN_MS:
+            time.sleep(delaytime / 1000.0)
+            return
+        deadline = time.perf_counter_ns() + int(delaytime * 1000000)
+        while time.perf_counter_ns() < deadline:
+            pass
+
+    def wait_busy(self, timeout_ms, ready_level=1):
+        """
+        Block until BUSY reads ready_level or timeout_ms passes; returns
+        whether it is ready. With gpiod it sleeps in poll() on the line
+        request fd and wakes on the BUSY edge instead of sampling the pin
+        every few ms.
+        """
+        if self._batch:
+            self._spi_flush_batch()
+        gpio = self._gpio
+        deadline = time.monotonic() + timeout_ms / 1000.0
+        while True:
+            # drop edges queued since the last wait, then look at the level
+            gpio.drain(self.BUSY_PIN)
+            if gpio.read(self.BUSY_PIN) == ready_level:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            gpio.wait_edge(self.BUSY_PIN, remaining)
 
     # --- SPI helpers expected by drivers ---
     def spi_writebyte(self, data):
-        # accept list/bytes/bytearray
-        if isinstance(data, (bytes, bytearray)):
-            self.SPI.writebytes(list(data))
-        else:
-            self.SPI.writebytes(list(data))
-
-    def spi_writebyte2(self, data):
-        # some drivers call this variant; treat the same
-        self.spi_writebyte(data)
+        if self._batch is not None:
+            self._spi_queue(data)
+            return
+        # writebytes2 takes bytes/bytearray/memoryview through the buffer
+        # protocol (no per-byte list) as well as plain int lists, and splits
+        # large writes to the spidev bufsiz itself. xfer3 would issue the
+        # same per-bufsiz ioctls but also build a tuple of the read-back
+        # bytes, so it is no faster for large payloads.
+        self.SPI.writebytes2(data)
+
+    # some drivers call this variant; same function, no extra call layer
+    spi_writebyte2 = spi_writebyte
+
+    def spi_scratch(self, size):
+        """
+        A reusable write buffer: memoryview of exactly size bytes, valid
+        until the next call. Drivers fill it in place and send it with
+        spi_write_view() (or SPI.writebytes2) instead of building a new
+        bytearray per frame. Starts at the spidev bufsiz, grows on demand.
+        """
+        if len(self._spi_scratch) < size:
+            self._spi_scratch = bytearray(size)
+        return memoryview(self._spi_scratch)[:size]
+
+    def spi_write_view(self, mv):
+        if self._batch is not None:
+            self._spi_queue(mv)
+            return
+        self.SPI.writebytes2(mv)  # spidev chunks to bufsiz itself
+
+    def set_spi_hz(self, hz):
+        """Change the SPI clock; kept across module_exit()/module_init()"""
+        self.SPI_CLOCK_HZ = hz
+        if self._spi_inited:
+            self.SPI.max_speed_hz = hz
+
+    # --- Batched SPI ---
+    def spi_begin_batch(self):
+        """
+        Queue spi_writebyte() calls instead of sending them. Consecutive
+        data writes are merged and go out as one transfer per DC run at
+        spi_end_batch(), or as soon as the driver reads a pin, delays or
+        drives another pin. Writes made straight on SPI are not queued.
+        """
+        if self._batch is None:
+            self._batch = []
+
+    def spi_end_batch(self):
+        if self._batch is not None:
+            self._spi_flush_batch()
+            self._batch = None
 
     # --- Alternate shared-lib SPI (rarely used) ---
     def DEV_SPI_write(self, data):
-        if self.DEV_SPI:
-            self.DEV_SPI.DEV_SPI_SendData(data)
+        self._dev_send(data)
 
     def DEV_SPI_nwrite(self, data):
-        if self.DEV_SPI:
-            self.DEV_SPI.DEV_SPI_SendnData(data)
+        buf = data if isinstance(data, bytearray) else bytearray(data)
+        self._dev_sendn((c_ubyte * len(buf)).from_buffer(buf))
 
     def DEV_SPI_read(self):
-        if self.DEV_SPI:
-            return self.DEV_SPI.DEV_SPI_ReadData()
-        return 0
+        return self._dev_recv()
 
     # --- Module lifecycle ---
     def module_init(self, cleanup=False):
+        if cleanup:
+            self._use_unclaimed_gpio()
+        elif self._cs_gpio:
+            # Leaving the .so path: stop driving GPIO8 so it is not held
+            # high under spidev (the .so path always runs on RPi.GPIO)
+            self._gpio.free(self.CS_PIN)
         # Power pin on first so the panel is powered before SPI/RESET
         self._gpio_setup_basic()
+        # Decided per init; _spi_open() reconfigures SPI when it changes
+        self._cs_gpio = cleanup
 
         if cleanup:
             # Legacy path using DEV_Config_xx.so if present
-            find_dirs = [
-                os.path.dirname(os.path.realpath(__file__)),
-                '/usr/local/lib',
-                '/usr/lib',
-            ]
-            self.DEV_SPI = None
-            val = int(os.popen('getconf LONG_BIT').read() or "64")
-            so_name = 'DEV_Config_64.so' if val == 64 else 'DEV_Config_32.so'
-            for d in find_dirs:
-                so_path = os.path.join(d, so_name)
-                if os.path.exists(so_path):
-                    self.DEV_SPI = CDLL(so_path)
-                    break
-            if self.DEV_SPI is None:
-                raise RuntimeError('Cannot find DEV_Config_xx.so')
+            self.DEV_SPI = self._dev_spi_load()
+            self._dev_send = self.DEV_SPI.DEV_SPI_SendData
+            self._dev_sendn = self.DEV_SPI.DEV_SPI_SendnData
+            self._dev_recv = self.DEV_SPI.DEV_SPI_ReadData
+            # CS as GPIO output, inactive HIGH (active-low CS)
+            self._gpio.claim({self.CS_PIN: 1})
             # Ensure SPI also opened for compatibility
             self._spi_open()
             if hasattr(self.DEV_SPI, 'DEV_Module_Init'):
@@ -127,9 +430,26 @@ class RaspberryPi:
             self._spi_open()
 
         # Ensure panel power is enabled
-        self.GPIO.output(self.PWR_PIN, 1)
+        self._gpio_out(self.PWR_PIN, 1)
         return 0
 
+    def module_sleep(self):
+        """
+        Lightweight module_exit() for a panel that will be woken again:
+        control lines and panel power go low, but the SPI fd and GPIO lines
+        stay open, so the next module_init() skips the open/config ioctls.
+        Use module_exit() to tear down.
+        """
+        # Like module_exit(): also called with the lines released, or before
+        # any module_init(), where there is nothing to drive
+        try:
+            self.spi_end_batch()
+            self.digital_write_many({self.RST_PIN: 0, self.DC_PIN: 0, self.PWR_PIN: 0})
+            logger.debug("close 5V, Module enters 0 power consumption ...")
+        except Exception:
+            pass
+        self._gpio_inited = False  # next module_init() re-drives the initial levels
+
     def module_exit(self, cleanup=False):
         logger.debug("spi end")
         try:
@@ -140,52 +460,162 @@ class RaspberryPi:
 
         # Put control lines low; keep BUSY as input
         try:
-            self.GPIO.output(self.RST_PIN, 0)
-            self.GPIO.output(self.DC_PIN, 0)
-            self.GPIO.output(self.PWR_PIN, 0)
+            self.digital_write_many({self.RST_PIN: 0, self.DC_PIN: 0, self.PWR_PIN: 0})
             logger.debug("close 5V, Module enters 0 power consumption ...")
         except Exception:
             pass
 
-        if cleanup and self._gpio_inited:
-            try:
-                self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.BUSY_PIN, self.PWR_PIN])
-            except Exception:
-                self.GPIO.cleanup()
+        if cleanup:
+            self._gpio.release()  # hand the lines back to the kernel
         self._spi_inited = False
         self._gpio_inited = False
 
     # --- internal helpers ---
+    @classmethod
+    def _dev_spi_load(cls):
+        """
+        Find and dlopen DEV_Config_xx.so on first use only. Reusing the
+        CDLL also keeps the function pointers ctypes has already resolved.
+        """
+        val = struct.calcsize("P") * 8  # pointer size = userland word size
+        so_name = 'DEV_Config_64.so' if val == 64 else 'DEV_Config_32.so'
+        lib = cls._DEV_SPI_cache.get(so_name)
+        if lib is None:
+            find_dirs = [
+                os.path.dirname(os.path.realpath(__file__)),
+                '/usr/local/lib',
+                '/usr/lib',
+            ]
+            for d in find_dirs:
+                so_path = os.path.join(d, so_name)
+                if os.path.exists(so_path):
+                    lib = CDLL(so_path)
+                    break
+            if lib is None:
+                raise RuntimeError('Cannot find DEV_Config_xx.so')
+            # Declare the DEV_Config.h prototypes so ctypes converts
+            # arguments directly instead of guessing on every call
+            lib.DEV_SPI_SendData.argtypes = [c_ubyte]
+            lib.DEV_SPI_SendData.restype = None
+            lib.DEV_SPI_SendnData.argtypes = [POINTER(c_ubyte)]
+            lib.DEV_SPI_SendnData.restype = None
+            lib.DEV_SPI_ReadData.argtypes = []
+            lib.DEV_SPI_ReadData.restype = c_ubyte
+            cls._DEV_SPI_cache[so_name] = lib
+        return lib
+
+    def _use_unclaimed_gpio(self):
+        """
+        The legacy .so path always runs on RPi.GPIO. The shipped
+        DEV_Config_xx.so is built on lgpio and claims RST/DC/PWR/BUSY/CS
+        itself in DEV_Module_Init(), and spi0 may hold GPIO8 as its chip
+        select: gpiod or lgpio line requests from Python would make either
+        fail with EBUSY. RPi.GPIO drives the memory-mapped registers and
+        takes no kernel claim. Limitation: RPi.GPIO does not work on the
+        Pi 5, so neither does this path.
+        """
+        if isinstance(self._gpio, _RPiGPIO):
+            return
+        try:
+            gpio = _RPiGPIO(self.GPIO_CHIP)
+        except ImportError:
+            raise ImportError("module_init(cleanup=True) (DEV_Config_xx.so) needs RPi.GPIO") from None
+        self._gpio.release()  # hand back any lines an earlier module_init() held
+        self._gpio = gpio
+        self._gpio_out = gpio.out
+        self._gpio_in = gpio.read
+        self._gpio_inited = False
+
+    @classmethod
+    def _env_spi_hz(cls):
+        value = os.environ.get('EPD_SPI_HZ')
+        if value is None:
+            return cls.SPI_CLOCK_HZ
+        try:
+            hz = int(value)
+        except ValueError:
+            hz = 0
+        if hz <= 0:
+            logger.warning("Ignoring bad EPD_SPI_HZ=%r, using %d Hz", value, cls.SPI_CLOCK_HZ)
+            return cls.SPI_CLOCK_HZ
+        return hz
+
+    @staticmethod
+    def _spi_bufsiz():
+        try:
+            with open('/sys/module/spidev/parameters/bufsiz') as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return 4096  # spidev default
+
     def _gpio_setup_basic(self):
         if not self._gpio_inited:
-            self.GPIO.setwarnings(False)
-            self.GPIO.setmode(self.GPIO.BCM)
-            # Outputs
-            self.GPIO.setup(self.RST_PIN, self.GPIO.OUT, initial=self.GPIO.HIGH)
-            self.GPIO.setup(self.DC_PIN,  self.GPIO.OUT, initial=self.GPIO.LOW)
-            self.GPIO.setup(self.PWR_PIN, self.GPIO.OUT, initial=self.GPIO.LOW)
-            # NEW: CS pin as GPIO output, inactive HIGH (active-low CS)
-            self.GPIO.setup(self.CS_PIN,  self.GPIO.OUT, initial=self.GPIO.HIGH)
-            # Inputs: BUSY active-low with pull-up
-            self.GPIO.setup(self.BUSY_PIN, self.GPIO.IN, pull_up_down=self.GPIO.PUD_UP)
+            self._gpio.claim({
+                # Outputs
+                self.RST_PIN: 1,
+                self.DC_PIN:  0,
+                self.PWR_PIN: 0,
+                # Inputs: BUSY active-low with pull-up
+                self.BUSY_PIN: None,
+            })
+            # CS stays on its SPI function (CE0/CE1) unless the .so path needs it
             self._gpio_inited = True
 
+    def _spi_queue(self, data):
+        batch = self._batch
+        if self._dc and batch and batch[-1][0]:
+            buf = batch[-1][1]  # extend the running data chunk
+        else:
+            buf = bytearray()   # every command byte keeps its own chunk
+            batch.append([self._dc, buf])
+        try:
+            buf.extend(data)
+        except ValueError:  # ints outside 0..255, e.g. ~x from some drivers
+            buf.extend(x & 0xFF for x in data)
+
+    def _spi_flush_batch(self):
+        batch, self._batch = self._batch, []
+        for dc, buf in batch:
+            self._gpio_out(self.DC_PIN, dc)
+            if self._cs_gpio:
+                self._gpio_out(self.CS_PIN, 0)
+            self.SPI.writebytes2(buf)
+            if self._cs_gpio:
+                self._gpio_out(self.CS_PIN, 1)
+        if batch:
+            self._gpio_out(self.DC_PIN, self._dc)
 
     def _spi_open(self):
+        if self._spi_inited and self._spi_no_cs != self._cs_gpio:
+            # CS mode changed since the last init: reopen and reconfigure
+            self.SPI.close()
+            self._spi_inited = False
         if not self._spi_inited:
             self.SPI.open(self.SPI_BUS, self.SPI_DEVICE)
             self.SPI.max_speed_hz = self.SPI_CLOCK_HZ
             self.SPI.mode = 0b00
-            # NEW: let us control CS via GPIO (driver calls digital_write on CS)
+            self.SPI.bits_per_word = 8
+            self.SPI.threewire = False  # separate MOSI; the panel is never read back
+            # Set both ways: the kernel keeps the mode bits across opens.
+            # On the legacy .so path CS is a GPIO driven from Python.
             try:
-                self.SPI.no_cs = True
+                self.SPI.no_cs = self._cs_gpio
             except Exception:
                 pass
+            self._spi_no_cs = self._cs_gpio
             self._spi_inited = True
 
 
 # ----------------------------------------------------------------------
-# Jetson Nano and Sunrise X3 implementations (unchanged)
+# Jetson Nano and Sunrise X3 implementations. Both expose the same
+# driver-facing API as RaspberryPi, minus set_spi_hz and DEV_SPI_*:
+#  - JetsonNano: Jetson.GPIO + bit-banged sysfs_software_spi.so; whole
+#    buffers go out in one SYSFS_software_spi_transfer_buf() call when the
+#    .so exports it
+#  - SunriseX3: Hobot.GPIO + spidev on bus 2, buffers sent as-is
+# On both, wait_busy polls BUSY every 10 ms, digital_write_many writes pin
+# by pin, spi_begin/end_batch are no-ops, spi_scratch is a plain reusable
+# buffer and module_sleep is module_exit.
 # ----------------------------------------------------------------------
 class JetsonNano:
     # Pin definition
@@ -211,25 +641,71 @@ class JetsonNano:
         if self.SPI is None:
             raise RuntimeError('Cannot find sysfs_software_spi.so')
 
+        # Newer builds of the .so export
+        #   void SYSFS_software_spi_transfer_buf(uint8_t *buf, size_t len)
+        # which clocks a whole buffer out in one call; older ones only have
+        # the per-byte SYSFS_software_spi_transfer()
+        self._transfer_buf = getattr(self.SPI, 'SYSFS_software_spi_transfer_buf', None)
+        if self._transfer_buf is not None:
+            self._transfer_buf.argtypes = [ctypes.POINTER(ctypes.c_ubyte), ctypes.c_size_t]
+            self._transfer_buf.restype = None
+
         import Jetson.GPIO
         self.GPIO = Jetson.GPIO
+        self._spi_scratch = bytearray()
 
     def digital_write(self, pin, value):
         self.GPIO.output(pin, value)
 
+    def digital_write_many(self, pin_values):
+        for pin, value in dict(pin_values).items():
+            self.digital_write(pin, value)
+
     def digital_read(self, pin):
         return self.GPIO.input(self.BUSY_PIN)
 
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
+    def wait_busy(self, timeout_ms, ready_level=1):
+        # no edge events here: poll the BUSY level
+        deadline = time.monotonic() + timeout_ms / 1000.0
+        while self.digital_read(self.BUSY_PIN) != ready_level:
+            if time.monotonic() >= deadline:
+                return False
+            self.delay_ms(10)
+        return True
+
     def spi_writebyte(self, data):
         self.SPI.SYSFS_software_spi_transfer(data[0])
 
     def spi_writebyte2(self, data):
+        if self._transfer_buf is not None:
+            if not isinstance(data, bytearray):
+                try:
+                    data = bytearray(data)
+                except ValueError:  # ints outside 0..255, e.g. ~x from some drivers
+                    data = bytearray(x & 0xFF for x in data)
+            if data:
+                self._transfer_buf((c_ubyte * len(data)).from_buffer(data), len(data))
+            return
         for i in range(len(data)):
             self.SPI.SYSFS_software_spi_transfer(data[i])
 
+    def spi_begin_batch(self):
+        pass
+
+    def spi_end_batch(self):
+        pass
+
+    def spi_scratch(self, size):
+        if len(self._spi_scratch) < size:
+            self._spi_scratch = bytearray(size)
+        return memoryview(self._spi_scratch)[:size]
+
+    def spi_write_view(self, mv):
+        self.spi_writebyte2(mv)
+
     def module_init(self):
         self.GPIO.setmode(self.GPIO.BCM)
         self.GPIO.setwarnings(False)
@@ -251,6 +727,8 @@ class JetsonNano:
         self.GPIO.output(self.PWR_PIN, 0)
         self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN, self.PWR_PIN])
 
+    module_sleep = module_exit  # no warm path for the software SPI
+
 
 class SunriseX3:
     # Pin definition
@@ -266,22 +744,50 @@ class SunriseX3:
         import Hobot.GPIO
         self.GPIO = Hobot.GPIO
         self.SPI = spidev.SpiDev()
+        self._spi_scratch = bytearray()
 
     def digital_write(self, pin, value):
         self.GPIO.output(pin, value)
 
+    def digital_write_many(self, pin_values):
+        for pin, value in dict(pin_values).items():
+            self.digital_write(pin, value)
+
     def digital_read(self, pin):
         return self.GPIO.input(pin)
 
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
+    def wait_busy(self, timeout_ms, ready_level=1):
+        # no edge events here: poll the BUSY level
+        deadline = time.monotonic() + timeout_ms / 1000.0
+        while self.digital_read(self.BUSY_PIN) != ready_level:
+            if time.monotonic() >= deadline:
+                return False
+            self.delay_ms(10)
+        return True
+
     def spi_writebyte(self, data):
-        self.SPI.writebytes(data)
+        self.SPI.writebytes2(data)  # buffers go straight through, no int list
 
     def spi_writebyte2(self, data):
         self.SPI.xfer3(data)
 
+    def spi_begin_batch(self):
+        pass
+
+    def spi_end_batch(self):
+        pass
+
+    def spi_scratch(self, size):
+        if len(self._spi_scratch) < size:
+            self._spi_scratch = bytearray(size)
+        return memoryview(self._spi_scratch)[:size]
+
+    def spi_write_view(self, mv):
+        self.spi_writebyte2(mv)
+
     def module_init(self):
         if self.Flag == 0:
             self.Flag = 1
@@ -310,26 +816,56 @@ class SunriseX3:
         self.GPIO.output(self.PWR_PIN, 0)
         self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN], self.PWR_PIN)
 
+    module_sleep = module_exit  # module_init() reopens SPI after any exit here
+
 
 # ----------------------------------------------------------------------
 # Platform selection
 # ----------------------------------------------------------------------
-if sys.version_info[0] == 2:
-    process = subprocess.Popen("cat /proc/cpuinfo | grep Raspberry", shell=True, stdout=subprocess.PIPE)
-else:
-    process = subprocess.Popen("cat /proc/cpuinfo | grep Raspberry", shell=True, stdout=subprocess.PIPE, text=True)
-output, _ = process.communicate()
-if sys.version_info[0] == 2:
-    output = output.decode(sys.stdout.encoding)
-
-if "Raspberry" in output:
-    implementation = RaspberryPi()
-elif os.path.exists('/sys/bus/platform/drivers/gpio-x3'):
-    implementation = SunriseX3()
-else:
-    implementation = JetsonNano()
-
-for func in [x for x in dir(implementation) if not x.startswith('_')]:
-    setattr(sys.modules[__name__], func, getattr(implementation, func))
+def _is_raspberry_pi():
+    try:
+        with open('/proc/cpuinfo') as f:
+            return "Raspberry" in f.read()
+    except OSError:
+        return False
+
+@functools.lru_cache(None)
+def _select_impl():
+    if _is_raspberry_pi():
+        return RaspberryPi()
+    elif os.path.exists('/sys/bus/platform/drivers/gpio-x3'):
+        return SunriseX3()
+    else:
+        return JetsonNano()
+
+# What drivers and examples use from the selected implementation; other
+# attributes stay reachable through epdconfig.implementation
+_EXPORTS = (
+    'RST_PIN', 'DC_PIN', 'CS_PIN', 'BUSY_PIN', 'PWR_PIN', 'SPI',
+    'digital_write', 'digital_write_many', 'digital_read', 'delay_ms', 'wait_busy',
+    'spi_writebyte', 'spi_writebyte2', 'spi_scratch', 'spi_write_view', 'set_spi_hz',
+    'spi_begin_batch', 'spi_end_batch',
+    'module_init', 'module_sleep', 'module_exit',
+    'DEV_SPI_write', 'DEV_SPI_nwrite', 'DEV_SPI_read',
+)
+
+def __getattr__(name):
+    # PEP 562: the platform is only probed (and its GPIO/SPI libraries
+    # imported) on first use of a module attribute, not at import time.
+    # The exports are then bound as real globals, so this runs once.
+    # __all__ is built here too ("import *" asks for it first), from the
+    # names the selected implementation actually has: Jetson / Sunrise X3
+    # have no set_spi_hz or DEV_SPI_* (.so path).
+    g = globals()
+    if 'implementation' not in g and (name == '__all__' or not name.startswith('__')):
+        impl = _select_impl()
+        bound = [n for n in _EXPORTS if hasattr(impl, n)]
+        g.update({n: getattr(impl, n) for n in bound})
+        g['__all__'] = bound
+        g['implementation'] = impl
+    try:
+        return g[name]
+    except KeyError:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name)) from None
 
 ### END OF FILE ###
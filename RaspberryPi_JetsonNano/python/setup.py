@@ -4,7 +4,7 @@ from setuptools import setup
 dependencies = ['Pillow']
 
 if os.path.exists('/sys/bus/platform/drivers/gpiomem-bcm2835'):
-    dependencies += ['RPi.GPIO', 'spidev']
+    dependencies += ['gpiod>=2', 'RPi.GPIO', 'spidev']
 elif os.path.exists('/sys/bus/platform/drivers/gpio-x3'):
     dependencies += ['Hobot.GPIO', 'spidev']
 else: